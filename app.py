@@ -3,17 +3,83 @@
 
 from __future__ import annotations
 
+import os
 import random
+from bisect import bisect_left
+import stat
+import tempfile
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import IO, Dict, List, Optional, Tuple
 
 from flask import Flask, render_template, request, jsonify
 from datetime import datetime
 import json
 
+try:
+    import orjson
+except ImportError:  # 可选依赖，缺失时退回标准库 json
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:  # 可选依赖，批量抽取时退回逐个二分
+    np = None
+
+try:
+    from flask_compress import Compress
+except ImportError:  # 可选依赖，未安装时不压缩响应
+    Compress = None
+
 
 BASE_DIR = Path(__file__).resolve().parent
 
+# CSV 顺序读写使用更大的缓冲区，减少系统调用
+READ_BUFFER_SIZE = 1 << 18
+WRITE_BUFFER_SIZE = 1 << 16
+
+
+def _temp_file_for(target: Path, mode: str, **kwargs) -> IO:
+    # 与目标文件同目录，保证 os.replace 在同一文件系统内完成
+    return tempfile.NamedTemporaryFile(mode, dir=target.parent, suffix=".tmp", delete=False, **kwargs)
+
+
+# 进程 umask；os.umask 只能"设置并返回旧值"，在导入时（单线程）读取一次
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _replace_file(tmp_name: str, target: Path) -> None:
+    # NamedTemporaryFile 默认权限为 0600，替换前沿用目标文件原有的权限；
+    # 目标尚不存在时按普通新建文件处理（0666 & ~umask）
+    try:
+        mode = stat.S_IMODE(target.stat().st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    os.chmod(tmp_name, mode)
+    os.replace(tmp_name, target)
+
+
+SHOP_FIELDS: Tuple[str, str, str] = ("name", "avg_price", "recommended_dishes")
+
+
+def _column_indices(header: List[str]) -> Tuple[int, int, int]:
+    # 缺失的列映射到行尾之外，读取时按空字符串处理
+    positions = {h.strip(): i for i, h in enumerate(header)}
+    width = len(header)
+    i_name, i_price, i_dishes = (positions.get(col, width) for col in SHOP_FIELDS)
+    return i_name, i_price, i_dishes
+
+
+def _pad_row(row: List[str], indices: Tuple[int, int, int]) -> List[str]:
+    return row + [""] * (max(indices) + 1 - len(row))
+
+
+# 已解析的 CSV 行缓存：csv_path -> (st_mtime_ns, st_size, items)
+_CACHE: Dict[Path, Tuple[int, int, List[Dict[str, str]]]] = {}
+# 仅行数的缓存：csv_path -> (st_mtime_ns, st_size, count)
+_COUNT_CACHE: Dict[Path, Tuple[int, int, int]] = {}
+
 
 class Category:
     def __init__(self, key: str, display_name: str, csv_filename: str) -> None:
@@ -22,26 +88,64 @@ class Category:
         self.csv_path = BASE_DIR / csv_filename
 
     def load_items(self) -> List[Dict[str, str]]:
+        try:
+            st = self.csv_path.stat()
+        except FileNotFoundError:
+            _CACHE.pop(self.csv_path, None)
+            return []
+        # 文件未变化（mtime 与大小一致）时直接复用上次的解析结果
+        cached = _CACHE.get(self.csv_path)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+
         items: List[Dict[str, str]] = []
-        if not self.csv_path.exists():
-            return items
         # 使用 csv 模块读取，支持带 BOM 的 utf-8-sig
         import csv
 
-        with self.csv_path.open("r", encoding="utf-8-sig", newline="") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # 统一列名与空值
-                name = (row.get("name") or "").strip()
-                price = (row.get("avg_price") or "").strip()
-                dishes = (row.get("recommended_dishes") or "").strip()
-                items.append({
-                    "name": name,
-                    "avg_price": price,
-                    "recommended_dishes": dishes,
-                })
+        with self.csv_path.open("r", encoding="utf-8-sig", newline="", buffering=READ_BUFFER_SIZE) as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is not None:
+                indices = _column_indices(header)
+                i_name, i_price, i_dishes = indices
+                max_index = max(indices)
+                for row in reader:
+                    if not row:
+                        continue
+                    if len(row) <= max_index:
+                        # 列数不足的行以空字符串补齐
+                        row = _pad_row(row, indices)
+                    items.append({
+                        "name": row[i_name].strip(),
+                        "avg_price": row[i_price].strip(),
+                        "recommended_dishes": row[i_dishes].strip(),
+                    })
+        _CACHE[self.csv_path] = (st.st_mtime_ns, st.st_size, items)
         return items
 
+    def count_items(self) -> int:
+        try:
+            st = self.csv_path.stat()
+        except FileNotFoundError:
+            _COUNT_CACHE.pop(self.csv_path, None)
+            return 0
+        # 已有解析结果时直接取长度
+        cached = _CACHE.get(self.csv_path)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return len(cached[2])
+        counted = _COUNT_CACHE.get(self.csv_path)
+        if counted is not None and counted[0] == st.st_mtime_ns and counted[1] == st.st_size:
+            return counted[2]
+        # 仅统计换行数（扣除表头），无需逐行解析 CSV
+        with self.csv_path.open("rb") as f:
+            data = f.read()
+        lines = data.count(b"\n")
+        if data and not data.endswith(b"\n"):
+            lines += 1
+        n = max(0, lines - 1)
+        _COUNT_CACHE[self.csv_path] = (st.st_mtime_ns, st.st_size, n)
+        return n
+
 
 CATEGORIES: List[Category] = [
     Category("economy", "经济餐", "Economy meal_filtered.csv"),
@@ -52,19 +156,48 @@ CATEGORIES: List[Category] = [
 CATEGORY_BY_KEY: Dict[str, Category] = {c.key: c for c in CATEGORIES}
 
 
+@lru_cache(maxsize=64)
+def _category_cdf(pairs: Tuple[Tuple[str, int], ...]) -> Tuple[Tuple[Category, ...], Tuple[int, ...]]:
+    # 同一组权重只构建一次累计分布
+    categories: List[Category] = []
+    cdf: List[int] = []
+    cursor = 0
+    for key, w in pairs:
+        cursor += w
+        categories.append(CATEGORY_BY_KEY[key])
+        cdf.append(cursor)
+    return tuple(categories), tuple(cdf)
+
+
+def _weight_pairs(weights: Dict[str, int]) -> Tuple[Tuple[str, int], ...]:
+    # 过滤掉未知类别与非正权重
+    return tuple((k, max(0, int(v))) for k, v in weights.items() if k in CATEGORY_BY_KEY)
+
+
 def choose_category_by_weights(weights: Dict[str, int]) -> Optional[Category]:
-    # 过滤掉非正权重
-    valid_pairs = [(CATEGORY_BY_KEY[k], max(0, int(v))) for k, v in weights.items() if k in CATEGORY_BY_KEY]
-    total = sum(w for _, w in valid_pairs)
+    categories, cdf = _category_cdf(_weight_pairs(weights))
+    total = cdf[-1] if cdf else 0
     if total <= 0:
         return None
-    threshold = random.randint(1, total)
-    cursor = 0
-    for category, w in valid_pairs:
-        cursor += w
-        if threshold <= cursor:
-            return category
-    return None
+    # 整数 CDF 上精确抽样；random.choices 会把累计权重转成 float，超大权重会溢出
+    return categories[bisect_left(cdf, random.randint(1, total))]
+
+
+# numpy.random.randint 的上界须落在 int64 范围内
+_NP_MAX_TOTAL = 2 ** 63 - 2
+
+
+def choose_categories_by_weights(weights: Dict[str, int], k: int) -> List[Category]:
+    # 批量抽取类别：累计分布只构建一次，k 个阈值一起二分查找
+    categories, cdf = _category_cdf(_weight_pairs(weights))
+    total = cdf[-1] if cdf else 0
+    if total <= 0 or k <= 0:
+        return []
+    if np is None or total > _NP_MAX_TOTAL:
+        # 逐个在整数 CDF 上二分，不受 int64 / float 范围限制
+        return [categories[bisect_left(cdf, random.randint(1, total))] for _ in range(k)]
+    thresholds = np.random.randint(1, total + 1, size=k)
+    return [categories[i] for i in np.searchsorted(cdf, thresholds, side="left").tolist()]
 
 
 def pick_random_item(items: List[Dict[str, str]]) -> Optional[Dict[str, str]]:
@@ -75,6 +208,42 @@ def pick_random_item(items: List[Dict[str, str]]) -> Optional[Dict[str, str]]:
 
 app = Flask(__name__)
 
+if Compress is not None:
+    Compress(app)
+
+# GET / 的浏览器缓存时长（秒）
+INDEX_MAX_AGE = 10
+
+
+@app.after_request
+def _set_cache_headers(response):
+    if request.method == "POST":
+        response.headers["Cache-Control"] = "no-store"
+    elif request.path == "/" and response.status_code == 200:
+        response.headers["Cache-Control"] = f"private, max-age={INDEX_MAX_AGE}"
+    return response
+
+
+def _render_index(
+    weights: Dict[str, int],
+    chosen_category: Optional[Category] = None,
+    chosen_item: Optional[Dict[str, str]] = None,
+    error_message: Optional[str] = None,
+    success_message: Optional[str] = None,
+) -> str:
+    # 统计每个类别的可选数量（走行数缓存，不解析 CSV）
+    counts = {c.key: c.count_items() for c in CATEGORIES}
+    return render_template(
+        "index.html",
+        categories=CATEGORIES,
+        weights=weights,
+        counts=counts,
+        chosen_category=chosen_category,
+        chosen_item=chosen_item,
+        error_message=error_message,
+        success_message=success_message,
+    )
+
 
 def _default_weights() -> Dict[str, int]:
     # 默认 7:2:1 （经济:中档:高档）
@@ -84,24 +253,60 @@ def _default_weights() -> Dict[str, int]:
 WEIGHTS_FILE = BASE_DIR / "weights.json"
 
 
+# weights.json 的缓存：(st_ino, st_mtime_ns, st_size, weights)
+# 每次保存都经 os.replace 换成新 inode，多 worker 下同大小的改写也能被发现
+_WEIGHTS_CACHE: Optional[Tuple[int, int, int, Dict[str, int]]] = None
+
+
+def _normalize_weights(data: Dict[str, int]) -> Dict[str, int]:
+    # 只保留已知类别
+    weights = {c.key: int(max(0, int(data.get(c.key, 0)))) for c in CATEGORIES}
+    # 若全为 0，则回退默认
+    if sum(weights.values()) <= 0:
+        return _default_weights()
+    return weights
+
+
 def _load_weights() -> Dict[str, int]:
-    if WEIGHTS_FILE.exists():
-        try:
-            data = json.loads(WEIGHTS_FILE.read_text(encoding="utf-8"))
-            # 只保留已知类别
-            weights = {c.key: int(max(0, int(data.get(c.key, 0)))) for c in CATEGORIES}
-            # 若全为 0，则回退默认
-            if sum(weights.values()) <= 0:
-                return _default_weights()
-            return weights
-        except Exception:
-            return _default_weights()
-    return _default_weights()
-
-
-def _save_weights(weights: Dict[str, int]) -> None:
+    global _WEIGHTS_CACHE
+    try:
+        st = WEIGHTS_FILE.stat()
+    except FileNotFoundError:
+        _WEIGHTS_CACHE = None
+        return _default_weights()
+    if _WEIGHTS_CACHE is not None and _WEIGHTS_CACHE[:3] == (st.st_ino, st.st_mtime_ns, st.st_size):
+        return dict(_WEIGHTS_CACHE[3])
+    try:
+        raw = WEIGHTS_FILE.read_bytes()
+        data = orjson.loads(raw) if orjson is not None else json.loads(raw.decode("utf-8"))
+        weights = _normalize_weights(data)
+    except Exception:
+        return _default_weights()
+    _WEIGHTS_CACHE = (st.st_ino, st.st_mtime_ns, st.st_size, weights)
+    return dict(weights)
+
+
+def _save_weights(weights: Dict[str, int]) -> Dict[str, int]:
+    """保存权重，返回之后 _load_weights() 将得到的结果。"""
+    global _WEIGHTS_CACHE
     safe = {c.key: int(max(0, int(weights.get(c.key, 0)))) for c in CATEGORIES}
-    WEIGHTS_FILE.write_text(json.dumps(safe, ensure_ascii=False, indent=2), encoding="utf-8")
+    # 先写临时文件再替换，避免并发读取到写了一半的内容
+    if orjson is not None:
+        payload = orjson.dumps(safe)
+    else:
+        payload = json.dumps(safe, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    tmp = _temp_file_for(WEIGHTS_FILE, "wb")
+    try:
+        with tmp:
+            tmp.write(payload)
+        _replace_file(tmp.name, WEIGHTS_FILE)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+    st = WEIGHTS_FILE.stat()
+    effective = _normalize_weights(safe)
+    _WEIGHTS_CACHE = (st.st_ino, st.st_mtime_ns, st.st_size, effective)
+    return dict(effective)
 
 
 def _parse_weights_from_request() -> Dict[str, int]:
@@ -142,25 +347,33 @@ def index():
             else:
                 chosen_item = pick_random_item(items)
 
-    # 统计每个类别的可选数量
-    counts = {c.key: len(c.load_items()) for c in CATEGORIES}
-
-    return render_template(
-        "index.html",
-        categories=CATEGORIES,
-        weights=weights,
-        counts=counts,
+    return _render_index(
+        weights,
         chosen_category=chosen_category,
         chosen_item=chosen_item,
         error_message=error_message,
-        success_message=None,
     )
 
 
+# /api/draw?n=K 单次最多抽取的数量
+MAX_DRAWS = 100
+
+
+def _category_payload(category: Category) -> Dict[str, str]:
+    return {
+        "key": category.key,
+        "name": category.display_name,
+        "csv": category.csv_path.name,
+    }
+
+
 @app.route("/api/draw", methods=["GET"])
 def api_draw():
     # GET /api/draw?weight_economy=3&weight_medium=2&weight_top=1
+    # 附加 n=K 可一次抽取 K 个结果
     weights = _parse_weights_from_request()
+    if request.args.get("n") is not None:
+        return _api_draw_batch(weights)
     chosen_category = choose_category_by_weights(weights)
     if chosen_category is None:
         return jsonify({"ok": False, "error": "invalid_weights"}), 400
@@ -170,22 +383,50 @@ def api_draw():
     item = pick_random_item(items) or {}
     return jsonify({
         "ok": True,
-        "category": {
-            "key": chosen_category.key,
-            "name": chosen_category.display_name,
-            "csv": chosen_category.csv_path.name,
-        },
+        "category": _category_payload(chosen_category),
         "item": item,
         "weights": weights,
     })
 
 
+def _api_draw_batch(weights: Dict[str, int]):
+    try:
+        n = int(request.args.get("n", ""))
+    except ValueError:
+        return jsonify({"ok": False, "error": "invalid_n"}), 400
+    if not 1 <= n <= MAX_DRAWS:
+        return jsonify({"ok": False, "error": "invalid_n"}), 400
+    chosen = choose_categories_by_weights(weights, n)
+    if not chosen:
+        return jsonify({"ok": False, "error": "invalid_weights"}), 400
+    # 每个抽中的类别只取一次门店列表
+    items_by_key: Dict[str, List[Dict[str, str]]] = {}
+    for category in chosen:
+        if category.key not in items_by_key:
+            items = category.load_items()
+            if not items:
+                return jsonify({"ok": False, "error": "empty_category", "category": category.key}), 400
+            items_by_key[category.key] = items
+    draws = []
+    for category in chosen:
+        items = items_by_key[category.key]
+        draws.append({
+            "category": _category_payload(category),
+            "item": items[random.randrange(len(items))],
+        })
+    return jsonify({
+        "ok": True,
+        "draws": draws,
+        "weights": weights,
+    })
+
+
 def _append_decision(category_key: str, shop: Dict[str, str]) -> Path:
     out_path = BASE_DIR / "decisions.csv"
     exists = out_path.exists()
     import csv
 
-    with out_path.open("a", encoding="utf-8-sig", newline="") as f:
+    with out_path.open("a", encoding="utf-8-sig", newline="", buffering=WRITE_BUFFER_SIZE) as f:
         writer = csv.writer(f)
         if not exists:
             writer.writerow(["timestamp", "category_key", "category_name", "name", "avg_price", "recommended_dishes"])
@@ -222,75 +463,113 @@ def confirm():
         weights_now = _load_weights()
         current_val = int(weights_now.get(category_key, _default_weights()[category_key]))
         weights_now[category_key] = max(0, current_val - 1)
-        _save_weights(weights_now)
+        weights = _save_weights(weights_now)
 
-    weights = _load_weights()
-    counts = {c.key: len(c.load_items()) for c in CATEGORIES}
+    if error_message is not None:
+        weights = _load_weights()
 
-    return render_template(
-        "index.html",
-        categories=CATEGORIES,
-        weights=weights,
-        counts=counts,
-        chosen_category=None,
-        chosen_item=None,
-        error_message=error_message,
-        success_message=success_message,
-    )
+    return _render_index(weights, error_message=error_message, success_message=success_message)
 
 
 @app.route("/reset", methods=["POST"])
 def reset_weights():
     defaults = _default_weights()
     _save_weights(defaults)
-    counts = {c.key: len(c.load_items()) for c in CATEGORIES}
-    return render_template(
-        "index.html",
-        categories=CATEGORIES,
-        weights=defaults,
-        counts=counts,
-        chosen_category=None,
-        chosen_item=None,
-        error_message=None,
-        success_message="权重已重置为 7:2:1（每周一手动重置）",
+    return _render_index(defaults, success_message="权重已重置为 7:2:1（每周一手动重置）")
+
+
+# 超过该行数时删除门店改用 pandas（未安装则回退到 csv 模块）
+PANDAS_MIN_ROWS = 2000
+
+
+def _remove_shop_with_pandas(csv_path: Path, shop: Dict[str, str]) -> int:
+    import pandas as pd
+
+    df = pd.read_csv(csv_path, encoding="utf-8-sig", dtype=str, keep_default_na=False)
+    # 与 _column_indices 一致：列名去除首尾空白
+    df.columns = df.columns.str.strip()
+    for col in SHOP_FIELDS:
+        if col not in df.columns:
+            df[col] = ""
+    mask = (
+        (df["name"].str.strip() == (shop.get("name") or "").strip()) &
+        (df["avg_price"].str.strip() == (shop.get("avg_price") or "").strip()) &
+        (df["recommended_dishes"].str.strip() == (shop.get("recommended_dishes") or "").strip())
     )
+    removed = int(mask.sum())
+    if removed > 0:
+        # 与 csv 分支一致：CRLF 换行，写临时文件后原子替换
+        tmp = _temp_file_for(csv_path, "w", buffering=WRITE_BUFFER_SIZE, encoding="utf-8-sig", newline="")
+        try:
+            with tmp:
+                df.loc[~mask, list(SHOP_FIELDS)].to_csv(tmp, index=False, lineterminator="\r\n")
+            _replace_file(tmp.name, csv_path)
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+    return removed
 
 
 def _remove_shop_from_category(category_key: str, shop: Dict[str, str]) -> int:
     category = CATEGORY_BY_KEY.get(category_key)
     if category is None or not category.csv_path.exists():
         return 0
+    # 行数较多时交给 pandas 的 C 解析器处理
+    if category.count_items() >= PANDAS_MIN_ROWS:
+        try:
+            removed = _remove_shop_with_pandas(category.csv_path, shop)
+        except (ImportError, ValueError):
+            # 未安装 pandas，或解析失败（ParserError 等均为 ValueError 子类），交给更宽容的 csv 分支
+            pass
+        else:
+            if removed > 0:
+                _CACHE.pop(category.csv_path, None)
+                _COUNT_CACHE.pop(category.csv_path, None)
+            return removed
     import csv
 
-    # 读取全部
-    with category.csv_path.open("r", encoding="utf-8-sig", newline="") as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
-
     def _norm(s: Optional[str]) -> str:
         return (s or "").strip()
 
-    before = len(rows)
-    kept = [
-        r for r in rows
-        if not (
-            _norm(r.get("name")) == _norm(shop.get("name")) and
-            _norm(r.get("avg_price")) == _norm(shop.get("avg_price")) and
-            _norm(r.get("recommended_dishes")) == _norm(shop.get("recommended_dishes"))
-        )
-    ]
-    removed = before - len(kept)
+    # 目标字段只规范化一次；逐行先比较区分度最高的店名
+    tn, tp, td = _norm(shop.get("name")), _norm(shop.get("avg_price")), _norm(shop.get("recommended_dishes"))
+
+    # 边读边写到同目录的临时文件，完成后原子替换
+    removed = 0
+    csv_path = category.csv_path
+    tmp = _temp_file_for(csv_path, "w", buffering=WRITE_BUFFER_SIZE, encoding="utf-8-sig", newline="")
+    try:
+        with csv_path.open("r", encoding="utf-8-sig", newline="", buffering=READ_BUFFER_SIZE) as src, tmp:
+            reader = csv.reader(src)
+            writer = csv.writer(tmp)
+            writer.writerow(SHOP_FIELDS)
+            header = next(reader, None)
+            if header is not None:
+                indices = _column_indices(header)
+                i_name, i_price, i_dishes = indices
+                max_index = max(indices)
+                for row in reader:
+                    if not row:
+                        continue
+                    if len(row) <= max_index:
+                        row = _pad_row(row, indices)
+                    fields = (row[i_name], row[i_price], row[i_dishes])
+                    if fields[0].strip() == tn and fields[1].strip() == tp and fields[2].strip() == td:
+                        removed += 1
+                    else:
+                        writer.writerow(fields)
+        if removed > 0:
+            _replace_file(tmp.name, csv_path)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
 
-    if removed > 0:
-        with category.csv_path.open("w", encoding="utf-8-sig", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=["name", "avg_price", "recommended_dishes"])
-            writer.writeheader()
-            for r in kept:
-                writer.writerow({
-                    "name": r.get("name", ""),
-                    "avg_price": r.get("avg_price", ""),
-                    "recommended_dishes": r.get("recommended_dishes", ""),
-                })
+    if removed == 0:
+        os.unlink(tmp.name)
+    else:
+        # 文件已被改写，丢弃缓存以便下次重新解析
+        _CACHE.pop(category.csv_path, None)
+        _COUNT_CACHE.pop(category.csv_path, None)
     return removed
 
 
@@ -316,21 +595,18 @@ def remove_shop():
             error_message = "未在列表中找到完全匹配的记录（可能已删除或字段不一致）"
 
     weights = _load_weights()
-    counts = {c.key: len(c.load_items()) for c in CATEGORIES}
-    return render_template(
-        "index.html",
-        categories=CATEGORIES,
-        weights=weights,
-        counts=counts,
-        chosen_category=None,
-        chosen_item=None,
-        error_message=error_message,
-        success_message=success_message,
-    )
+    return _render_index(weights, error_message=error_message, success_message=success_message)
+
+
+def warm_caches() -> None:
+    # 预先解析 CSV 与权重；gunicorn preload 时在主进程执行，worker fork 后共享
+    for c in CATEGORIES:
+        c.load_items()
+    _load_weights()
 
 
 if __name__ == "__main__":
-    # 使用开发服务器启动
+    # 使用开发服务器启动（仅本地调试；生产环境使用 gunicorn -c gunicorn_conf.py app:app）
     app.run(host="0.0.0.0", port=5000, debug=True)
 
 
@@ -7,6 +7,11 @@ import re
 
 import pandas as pd
 
+try:
+    import pyarrow as pa
+except ImportError:  # 可选依赖，未安装时使用 object 类型的字符串匹配
+    pa = None
+
 
 NON_MEAL_KEYWORDS: List[str] = [
     "奶茶", "咖啡", "甜品", "蛋糕", "饮品", "饮料", "烘焙", "面包", "吐司",
@@ -14,11 +19,28 @@ NON_MEAL_KEYWORDS: List[str] = [
 ]
 
 
-def filter_dataframe(df: pd.DataFrame, keywords: List[str]) -> pd.DataFrame:
-    combined_text = df.get("name", "").fillna("").astype(str) + df.get("recommended_dishes", "").fillna("").astype(str)
-    pattern = "|".join(re.escape(k) for k in keywords)
-    mask = ~combined_text.str.contains(pattern, case=False, regex=True)
-    return df[mask].reset_index(drop=True)
+# 正则源串（大小写不敏感匹配由 filter_dataframe 的 case 参数控制）
+_NON_MEAL_PAT: str = "|".join(re.escape(k) for k in NON_MEAL_KEYWORDS)
+
+
+def _text_column(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns:
+        return pd.Series("", index=df.index)
+    return df[col].fillna("").astype(str)
+
+
+def filter_dataframe(df: pd.DataFrame, pattern: str = _NON_MEAL_PAT, case: bool = False) -> pd.DataFrame:
+    combined_text = _text_column(df, "name") + _text_column(df, "recommended_dishes")
+    mask = None
+    # pyarrow 字符串类型的 contains 走 C++（RE2）内核；RE2 不支持的语法或未安装 pyarrow 时退回 object 类型
+    if pa is not None:
+        try:
+            mask = combined_text.astype("string[pyarrow]").str.contains(pattern, case=case, regex=True, na=False)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            mask = None
+    if mask is None:
+        mask = combined_text.str.contains(pattern, case=case, regex=True, na=False)
+    return df[~mask].reset_index(drop=True)
 
 
 def process_file(csv_path: Path) -> None:
@@ -32,7 +54,7 @@ def process_file(csv_path: Path) -> None:
         df = pd.read_csv(csv_path, encoding="utf-8")
 
     before_n = len(df)
-    filtered = filter_dataframe(df, NON_MEAL_KEYWORDS)
+    filtered = filter_dataframe(df)
     after_n = len(filtered)
 
     out_path = csv_path.with_name(f"{csv_path.stem}_filtered{csv_path.suffix}")
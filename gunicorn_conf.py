@@ -0,0 +1,17 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# 生产环境启动：gunicorn -c gunicorn_conf.py app:app
+
+from multiprocessing import cpu_count
+
+bind = "0.0.0.0:5000"
+workers = cpu_count() * 2 + 1
+# 在主进程中加载应用，CSV / 权重缓存只解析一次并在 fork 后共享
+preload_app = True
+
+
+def when_ready(server) -> None:
+    from app import warm_caches
+
+    warm_caches()
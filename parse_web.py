@@ -5,6 +5,7 @@ import argparse
 import csv
 import sys
 import time
+from functools import lru_cache
 from typing import List, Dict, Optional
 
 import requests
@@ -12,27 +13,33 @@ from lxml import etree
 from urllib.parse import urljoin
 
 
-def extract_shops(html_text: str) -> List[Dict[str, object]]:
-    document = etree.HTML(html_text)
+# Precompiled XPath expressions used for every shop <li> on a page
+_LI_XP = etree.XPath('//li[.//h4]')
+_NAME_XP = etree.XPath('.//h4/text()')
+_PRICE_XP = etree.XPath('.//a[contains(@class, "mean-price")]//b/text()')
+_DISH_XP = etree.XPath('.//div[contains(@class, "recommend")]//a[contains(@class, "recommend-click")]/text()')
+
+
+def extract_shops(document: Optional[etree._Element]) -> List[Dict[str, object]]:
     if document is None:
         return []
 
     results: List[Dict[str, object]] = []
 
     # Each shop appears to be a <li> block that contains an <h4>
-    for li in document.xpath('//li[.//h4]'):
+    for li in _LI_XP(document):
         # Shop name
-        name_list = li.xpath('.//h4/text()')
+        name_list = _NAME_XP(li)
         if not name_list:
             continue
         name = name_list[0].strip()
 
         # Avg price: inside an <a class="mean-price"> ... <b>￥xx</b>
-        avg_price_list = li.xpath('.//a[contains(@class, "mean-price")]//b/text()')
+        avg_price_list = _PRICE_XP(li)
         avg_price = avg_price_list[0].strip() if avg_price_list else ''
 
         # Recommended dishes: <div class="recommend"> ... <a class="recommend-click">dish</a>
-        dishes = [t.strip() for t in li.xpath('.//div[contains(@class, "recommend")]//a[contains(@class, "recommend-click")]/text()') if t.strip()]
+        dishes = [t.strip() for t in _DISH_XP(li) if t.strip()]
 
         results.append({
             'name': name,
@@ -43,8 +50,16 @@ def extract_shops(html_text: str) -> List[Dict[str, object]]:
     return results
 
 
+@lru_cache(maxsize=8)
 def _format_cookies(cookies_str: str) -> Dict[str, str]:
-    return {pair.split('=')[0].strip(): pair.split('=')[1].strip() for pair in cookies_str.split(';') if '=' in pair}
+    # The same cookie string is reused for every page, so the parsed dict is cached; callers must not mutate it
+    cookies: Dict[str, str] = {}
+    for pair in cookies_str.split(';'):
+        if '=' not in pair:
+            continue
+        key, value = pair.split('=', 1)
+        cookies[key.strip()] = value.strip()
+    return cookies
 
 
 def load_html(url: str, cookies: Optional[str], timeout: int, session: Optional[requests.Session] = None, referer: Optional[str] = None) -> str:
@@ -128,15 +143,17 @@ def main() -> None:
             if '身份核实' in html_text:
                 raise RuntimeError('Hit identity verification page. Provide valid logged-in cookies with --cookies.')
 
-            shops = extract_shops(html_text)
-            for s in shops:
-                dishes_joined = '、'.join(s['recommended_dishes']) if s['recommended_dishes'] else ''
-                writer.writerow([s['name'], s['avg_price'], dishes_joined])
+            # Parse once; the same tree is used for shops and pagination
+            doc = etree.HTML(html_text)
+            shops = extract_shops(doc)
+            writer.writerows(
+                (s['name'], s['avg_price'], '、'.join(s['recommended_dishes']) if s['recommended_dishes'] else '')
+                for s in shops
+            )
 
             if args.max_pages and page_index >= args.max_pages:
                 break
 
-            doc = etree.HTML(html_text)
             if doc is None:
                 break
             prev_url = current_url
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 
 from pathlib import Path
-from typing import List, Optional
+from typing import List
 import re
 
 import pandas as pd
@@ -33,16 +33,28 @@ def compile_pattern(words: List[str]) -> re.Pattern:
     return re.compile(r"(" + "|".join(re.escape(w) for w in words) + r")", flags=re.IGNORECASE)
 
 
-def _parse_price(price_str: str) -> Optional[float]:
-    if not isinstance(price_str, str):
-        return None
-    m = re.search(r"(\d+(?:\.\d+)?)", price_str)
-    if not m:
-        return None
+def _build_automaton(words: List[str]):
+    # 可选依赖 pyahocorasick：一次扫描即可匹配全部字面量关键词
     try:
-        return float(m.group(1))
-    except ValueError:
+        import ahocorasick
+    except ImportError:
         return None
+    automaton = ahocorasick.Automaton()
+    for w in words:
+        automaton.add_word(w.lower(), w)
+    automaton.make_automaton()
+    return automaton
+
+
+_BRAND_PAT: re.Pattern = compile_pattern(BRAND_BLACKLIST)
+_KW_PAT: re.Pattern = compile_pattern(SHOP_KEYWORDS)
+_AUTOMATON = _build_automaton(BRAND_BLACKLIST + SHOP_KEYWORDS)
+
+
+def keyword_mask(name_series: pd.Series) -> pd.Series:
+    if _AUTOMATON is None:
+        return name_series.str.contains(_BRAND_PAT) | name_series.str.contains(_KW_PAT)
+    return name_series.str.lower().map(lambda s: next(_AUTOMATON.iter(s), None) is not None).astype(bool)
 
 
 def refine(csv_path: Path) -> None:
@@ -61,20 +73,14 @@ def refine(csv_path: Path) -> None:
             df[col] = ''
     name_series = df['name'].fillna('').astype(str)
 
-    brand_pat = compile_pattern(BRAND_BLACKLIST)
-    kw_pat = compile_pattern(SHOP_KEYWORDS)
-
-    brand_mask = name_series.str.contains(brand_pat)
-    kw_mask = name_series.str.contains(kw_pat)
-
     # 规则1：品牌/店名关键词
-    remove_mask = brand_mask | kw_mask
+    remove_mask = keyword_mask(name_series)
     kept_df = df[~remove_mask].reset_index(drop=True)
 
     # 规则2：人均价格 < 20 过滤
-    prices = kept_df['avg_price'].fillna('').astype(str).map(_parse_price)
-    price_mask = prices >= 20
-    final_df = kept_df[price_mask.fillna(False)].reset_index(drop=True)
+    prices = kept_df['avg_price'].fillna('').astype(str).str.extract(r"(\d+(?:\.\d+)?)", expand=False).astype(float)
+    price_mask = prices.ge(20)
+    final_df = kept_df[price_mask].reset_index(drop=True)
 
     removed_count = len(df) - len(final_df)
     # 覆盖写回原文件